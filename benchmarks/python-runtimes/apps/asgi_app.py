@@ -0,0 +1,20 @@
+async def app(scope, receive, send):
+    if scope['type'] != 'http':
+        return
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+    body = b''.join(chunks)
+    print('asgi received %d bytes' % len(body))
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'application/octet-stream'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,6 @@
+def handler(event, context):
+    print('lambda received %d bytes' % len(event['payload']))
+    return {
+        'payload': event['payload'],
+        'remainingMs': context.get_remaining_time_in_millis(),
+    }
@@ -0,0 +1,8 @@
+def app(environ, start_response):
+    body = environ['wsgi.input'].read(int(environ.get('CONTENT_LENGTH') or 0))
+    print('wsgi received %d bytes' % len(body))
+    start_response('200 OK', [
+        ('Content-Type', 'application/octet-stream'),
+        ('Content-Length', str(len(body))),
+    ])
+    return [body]
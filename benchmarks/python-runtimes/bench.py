@@ -0,0 +1,355 @@
+"""
+Benchmarks the Python runtime adapters against local stand-ins and prints
+the results as JSON:
+
+- vc_init.py (@vercel/python) in IPC mode, with the sample `handler`, WSGI
+  and ASGI apps, driven over HTTP while a fake IPC listener counts what the
+  runtime ships over `VERCEL_IPC_PATH`.
+- bootstrap.py (@vercel/fun) driven by a fake Lambda Runtime API, with
+  `FUN_PYTHON_WORKERS` set to each concurrency level.
+
+For every payload size and concurrency level it reports requests/sec,
+p50/p99 latency, the peak RSS of the runtime process tree and, for
+vc_init.py, the bytes and messages shipped over IPC.
+
+    python3 benchmarks/python-runtimes/bench.py --output bench.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from stand_ins import FakeIPCListener, FakeRuntimeAPI
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(os.path.dirname(HERE))
+APPS = os.path.join(HERE, 'apps')
+VC_INIT = os.path.join(ROOT, 'node_modules', '@vercel', 'python', 'vc_init.py')
+BOOTSTRAP = os.path.join(ROOT, 'node_modules', '@vercel', 'fun', 'dist', 'src', 'runtimes', 'python', 'bootstrap.py')
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return round(ordered[index] * 1000, 3)
+
+
+def process_tree_rss_kb(pid):
+    """
+    Current RSS of `pid` and all of its descendants, read from /proc.
+    Returns None where /proc is not available.
+    """
+    total = 0
+    pids = [pid]
+    while pids:
+        current = pids.pop()
+        try:
+            with open('/proc/%d/status' % current) as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+            for tid in os.listdir('/proc/%d/task' % current):
+                with open('/proc/%d/task/%s/children' % (current, tid)) as children:
+                    pids.extend(int(child) for child in children.read().split())
+        except (OSError, ValueError):
+            if current == pid:
+                return None
+    return total
+
+
+class RSSSampler:
+    """
+    Samples the RSS of a process tree on a background thread and keeps the
+    peak seen since the last `reset`.
+    """
+    def __init__(self, pid, interval=0.01):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            rss = process_tree_rss_kb(self.pid)
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def reset(self):
+        self.peak = process_tree_rss_kb(self.pid)
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def run_load(send_one, total, concurrency):
+    """
+    Calls `send_one(index, state)` `total` times from `concurrency` threads.
+    Each thread gets its own `state` dict, e.g. for a keep-alive connection.
+    """
+    lock = threading.Lock()
+    counter = iter(range(total))
+    latencies = []
+    errors = [0]
+
+    def worker():
+        state = {}
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                break
+            start = time.perf_counter()
+            try:
+                ok = send_one(index, state)
+            except Exception:
+                ok = False
+                state.clear()
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - start
+
+
+def summarize(latencies, errors, elapsed, total, completed=None):
+    if completed is None:
+        completed = total
+    return {
+        'requests': total,
+        'errors': errors,
+        'requestsPerSecond': round(completed / elapsed, 2) if elapsed else None,
+        'latencyMs': {
+            'p50': percentile(latencies, 0.50),
+            'p99': percentile(latencies, 0.99),
+        },
+    }
+
+
+def bench_vc_init(app, args, env):
+    """
+    Starts vc_init.py in IPC mode with the sample `app` and benchmarks it at
+    every payload size and concurrency level against the same warm process.
+    """
+    results = []
+    workdir = tempfile.mkdtemp(prefix='vc-bench-')
+    listener = FakeIPCListener(workdir)
+    process = None
+    try:
+        module = '%s_app' % app
+        shutil.copy(os.path.join(APPS, module + '.py'), workdir)
+        with open(args.vc_init) as source:
+            rendered = (
+                source.read()
+                .replace('__VC_HANDLER_MODULE_NAME', module)
+                .replace('__VC_HANDLER_ENTRYPOINT', module + '.py')
+            )
+        with open(os.path.join(workdir, 'vc__handler__python.py'), 'w') as target:
+            target.write(rendered)
+
+        spawned_at = time.perf_counter()
+        process = subprocess.Popen(
+            [args.python, 'vc__handler__python.py'],
+            cwd=workdir,
+            env=dict(os.environ, VERCEL_IPC_PATH=listener.path, **env),
+            stdout=subprocess.DEVNULL,
+        )
+        if not listener.started.wait(30):
+            raise RuntimeError('vc_init.py did not send server-started for the %s app' % app)
+        results.append({
+            'runtime': 'vc_init',
+            'app': app,
+            'scenario': 'startup',
+            'timeToServerStartedMs': round((time.perf_counter() - spawned_at) * 1000, 3),
+            'serverStarted': listener.server_started,
+            'rssKb': process_tree_rss_kb(process.pid),
+        })
+        port = listener.server_started['httpPort']
+        sampler = RSSSampler(process.pid)
+
+        for size in args.payload_sizes:
+            payload = (b'0123456789abcdef' * (size // 16 + 1))[:size]
+
+            def send_one(index, state):
+                conn = state.get('conn')
+                if conn is None:
+                    conn = state['conn'] = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                conn.request('POST', '/bench?i=%d' % index, body=payload, headers={
+                    'content-type': 'application/octet-stream',
+                    'x-vercel-internal-invocation-id': 'bench',
+                    'x-vercel-internal-request-id': str(index),
+                    'x-vercel-internal-span-id': 'bench',
+                    'x-vercel-internal-trace-id': 'bench',
+                })
+                res = conn.getresponse()
+                body = res.read()
+                if res.will_close:
+                    conn.close()
+                    state.pop('conn')
+                return res.status == 200 and len(body) == size
+
+            for concurrency in args.concurrency:
+                listener.reset()
+                sampler.reset()
+                latencies, errors, elapsed = run_load(send_one, args.requests, concurrency)
+                # Give the shipper a moment to deliver the last messages.
+                time.sleep(0.05)
+                ipc_bytes, ipc_messages = listener.snapshot()
+                result = {
+                    'runtime': 'vc_init',
+                    'app': app,
+                    'scenario': 'load',
+                    'payloadSize': size,
+                    'concurrency': concurrency,
+                }
+                result.update(summarize(latencies, errors, elapsed, args.requests))
+                result.update({
+                    'peakRssKb': sampler.peak,
+                    'ipcBytes': ipc_bytes,
+                    'ipcMessages': ipc_messages,
+                })
+                results.append(result)
+        sampler.stop()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+        listener.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def bench_bootstrap(args, env):
+    """
+    Runs bootstrap.py against the fake Runtime API, once per concurrency
+    level, with that many workers.
+    """
+    results = []
+    for concurrency in args.concurrency:
+        api = FakeRuntimeAPI()
+        worker_env = {'FUN_PYTHON_WORKERS': str(concurrency)}
+        worker_env.update(env)
+        process = subprocess.Popen(
+            [args.python, args.bootstrap],
+            env=dict(
+                os.environ,
+                AWS_LAMBDA_RUNTIME_API=api.address,
+                LAMBDA_TASK_ROOT=APPS,
+                _HANDLER='lambda_function.handler',
+                **worker_env
+            ),
+            stdout=subprocess.DEVNULL,
+        )
+        sampler = RSSSampler(process.pid)
+        try:
+            # Keep interpreter start-up and imports out of the first timing,
+            # as bench_vc_init does by waiting for `server-started`.
+            if not api.wait_for_polls(concurrency, 30):
+                raise RuntimeError('bootstrap.py did not start %d workers' % concurrency)
+            for size in args.payload_sizes:
+                events = [{'payload': 'x' * size} for _ in range(args.requests)]
+                sampler.reset()
+                elapsed = api.run(events, timeout=300)
+                result = {
+                    'runtime': 'bootstrap',
+                    'app': 'lambda_function',
+                    'scenario': 'load',
+                    'payloadSize': size,
+                    'concurrency': concurrency,
+                }
+                # Invocations that never completed count as errors, and
+                # requests/sec only counts the ones that did.
+                result.update(summarize(
+                    api.latencies, api.errors + api.incomplete, elapsed,
+                    args.requests, completed=args.requests - api.incomplete))
+                result.update({
+                    'peakRssKb': sampler.peak,
+                    'responseBytes': api.bytes_received,
+                })
+                results.append(result)
+        finally:
+            sampler.stop()
+            process.terminate()
+            process.wait(10)
+            api.close()
+    return results
+
+
+def parse_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the Python runtime adapters.')
+    parser.add_argument('--runtime', choices=['vc_init', 'bootstrap', 'all'], default='all')
+    parser.add_argument('--apps', default='handler,wsgi,asgi',
+                        help='comma separated sample apps for vc_init.py')
+    parser.add_argument('--payload-sizes', type=parse_list, default=[0, 1024, 65536, 1048576],
+                        help='comma separated request payload sizes in bytes')
+    parser.add_argument('--concurrency', type=parse_list, default=[1, 8, 32],
+                        help='comma separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='requests per payload size and concurrency level')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for the runtime process')
+    parser.add_argument('--python', default=sys.executable,
+                        help='interpreter used to run the runtimes')
+    parser.add_argument('--vc-init', default=VC_INIT)
+    parser.add_argument('--bootstrap', default=BOOTSTRAP)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    env = dict(item.split('=', 1) for item in args.env)
+
+    results = []
+    if args.runtime in ('vc_init', 'all'):
+        for app in args.apps.split(','):
+            results.extend(bench_vc_init(app, args, env))
+    if args.runtime in ('bootstrap', 'all'):
+        results.extend(bench_bootstrap(args, env))
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': subprocess.check_output(
+                [args.python, '-c', 'import sys; print(sys.version.split()[0])'],
+                universal_newlines=True).strip(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'requests': args.requests,
+            'env': env,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as target:
+            target.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
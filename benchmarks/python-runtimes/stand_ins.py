@@ -0,0 +1,209 @@
+"""
+Stand-ins for the two hosts the Python runtimes talk to:
+
+- `FakeIPCListener` plays the Vercel side of `VERCEL_IPC_PATH` for vc_init.py.
+- `FakeRuntimeAPI` plays `AWS_LAMBDA_RUNTIME_API` for the fun bootstrap.py.
+"""
+import collections
+import itertools
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeIPCListener:
+    """
+    Accepts the runtime's IPC connection and counts the NUL separated JSON
+    messages and raw bytes it ships.
+    """
+    def __init__(self, directory):
+        self.path = os.path.join(directory, 'ipc.sock')
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(1)
+        self.lock = threading.Lock()
+        self.bytes_received = 0
+        self.messages = collections.Counter()
+        self.server_started = None
+        self.started = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        conn, _ = self.sock.accept()
+        buffer = b''
+        while True:
+            data = conn.recv(1 << 16)
+            if not data:
+                break
+            buffer += data
+            with self.lock:
+                self.bytes_received += len(data)
+            *messages, buffer = buffer.split(b'\0')
+            for raw in messages:
+                message = json.loads(raw)
+                with self.lock:
+                    self.messages[message['type']] += 1
+                if message['type'] == 'server-started':
+                    self.server_started = message['payload']
+                    self.started.set()
+        conn.close()
+
+    def reset(self):
+        with self.lock:
+            self.bytes_received = 0
+            self.messages.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return self.bytes_received, dict(self.messages)
+
+    def close(self):
+        self.sock.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Runtimes are terminated mid long-poll; that is not worth a traceback.
+        pass
+
+
+class FakeRuntimeAPI:
+    """
+    Minimal Lambda Runtime API. Events queued with `run` are handed out on
+    `invocation/next`; latency is measured from handing an event out to
+    receiving its `/response` or `/error`.
+
+    Like fun's `RuntimeServer` it accepts concurrent `invocation/next` polls
+    and sends an epoch `Lambda-Runtime-Deadline-Ms` of now plus `timeout`
+    seconds. `wait_for_polls` waits for the runtime's workers to be ready. A response whose `remainingMs` is not positive counts as an
+    error, since the handler saw its deadline as already passed.
+    """
+    runtime_path = '/2018-06-01/runtime/invocation/'
+
+    def __init__(self, timeout=3):
+        self.timeout = timeout
+        self.events = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.latencies = []
+        self.errors = 0
+        self.incomplete = 0
+        self.bytes_received = 0
+        self.done = threading.Event()
+        self.remaining = 0
+        self.polls = 0
+        self.polled = threading.Condition(self.lock)
+        self.ids = itertools.count()
+        self.server = QuietHTTPServer(('127.0.0.1', 0), self.make_handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def address(self):
+        return '127.0.0.1:%d' % self.server.server_address[1]
+
+    def make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately; without this, small
+            # events stall on Nagle and delayed ACKs.
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if not self.path.startswith(api.runtime_path + 'next'):
+                    self.send_error(404)
+                    return
+                with api.lock:
+                    api.polls += 1
+                    api.polled.notify_all()
+                (request_id, body) = api.events.get()
+                self.send_response(200)
+                self.send_header('Lambda-Runtime-Aws-Request-Id', request_id)
+                self.send_header('Lambda-Runtime-Deadline-Ms', str(int((time.time() + api.timeout) * 1000)))
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                with api.lock:
+                    api.pending[request_id] = time.perf_counter()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                (request_id, kind) = self.path[len(api.runtime_path):].split('/', 1)
+                self.send_response(202)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                api.complete(request_id, kind, body)
+
+        return Handler
+
+    def complete(self, request_id, kind, body):
+        try:
+            expired = json.loads(body).get('remainingMs', 1) <= 0
+        except (ValueError, AttributeError):
+            expired = False
+        with self.lock:
+            started = self.pending.pop(request_id, None)
+            if started is None:
+                # Left over from a run that timed out.
+                return
+            self.latencies.append(time.perf_counter() - started)
+            if kind != 'response' or expired:
+                self.errors += 1
+            self.bytes_received += len(body)
+            self.remaining -= 1
+            if self.remaining <= 0:
+                self.done.set()
+
+    def wait_for_polls(self, count, timeout=None):
+        """
+        Waits until `invocation/next` has been polled `count` times, i.e. the
+        runtime has started and that many workers are waiting for an event.
+        Returns False if that did not happen within `timeout`.
+        """
+        with self.polled:
+            return self.polled.wait_for(lambda: self.polls >= count, timeout)
+
+    def run(self, events, timeout=None):
+        """
+        Queues `events` (a list of JSON-serializable objects) and waits for
+        all of them to complete. Returns the elapsed wall time in seconds.
+        Events that did not complete within `timeout` are counted in
+        `incomplete`.
+        """
+        with self.lock:
+            self.latencies = []
+            self.errors = 0
+            self.incomplete = 0
+            self.bytes_received = 0
+            self.remaining = len(events)
+            self.done.clear()
+        start = time.perf_counter()
+        for event in events:
+            self.events.put(('req-%d' % next(self.ids), json.dumps(event).encode()))
+        self.done.wait(timeout)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.incomplete = self.remaining
+            self.pending.clear()
+        while not self.events.empty():
+            self.events.get_nowait()
+        return elapsed
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,174 @@
+const fs = require('fs');
+const path = require('path');
+
+// Re-applies our changes to installed packages after `npm install` / `npm ci`
+// (wired up as the `postinstall` script), since both reinstall node_modules
+// from package-lock.json. Patches live in patches/ and use patch-package's
+// naming: `<name with / as +>+<version>.patch`, e.g. `@vercel+python+4.7.2.patch`.
+// They are applied here rather than with `git apply`, so installs also work
+// where git is not available.
+
+const ROOT = path.join(__dirname, '..');
+const PATCHES_DIR = path.join(ROOT, 'patches');
+
+// Splits text into lines that keep their `\n`; the last one may have none.
+function splitLines(text) {
+  return text.match(/[^\n]*\n|[^\n]+$/g) || [];
+}
+
+/**
+ * Parses a `git diff` of changed files into `{ file, hunks }` entries. Each
+ * hunk has the 1-based line it starts at and the lines it replaces, on both
+ * the old and the new side.
+ */
+function parsePatch(text) {
+  const files = [];
+  let file = null;
+  let hunk = null;
+  let lastLines = [];
+  for (const line of splitLines(text)) {
+    if (hunk && (hunk.oldLeft > 0 || hunk.newLeft > 0)) {
+      const content = line.slice(1);
+      if (line[0] === ' ' || line === '\n') {
+        hunk.old.lines.push(content || '\n');
+        hunk.new.lines.push(content || '\n');
+        hunk.oldLeft--;
+        hunk.newLeft--;
+        lastLines = [hunk.old.lines, hunk.new.lines];
+      } else if (line[0] === '-') {
+        hunk.old.lines.push(content);
+        hunk.oldLeft--;
+        lastLines = [hunk.old.lines];
+      } else if (line[0] === '+') {
+        hunk.new.lines.push(content);
+        hunk.newLeft--;
+        lastLines = [hunk.new.lines];
+      } else if (line[0] !== '\\') {
+        throw new Error(`Unexpected line in hunk: ${line.trim()}`);
+      }
+    } else if (line.startsWith('\\')) {
+      // `\ No newline at end of file` refers to the line before it
+      for (const lines of lastLines) {
+        lines[lines.length - 1] = lines[lines.length - 1].replace(/\n$/, '');
+      }
+    } else if (line.startsWith('diff --git ')) {
+      file = null;
+      hunk = null;
+    } else if (/^(new|deleted) file mode |^rename |^copy /.test(line)) {
+      throw new Error(`Only changes to existing files are supported: ${line.trim()}`);
+    } else if (line.startsWith('+++ b/')) {
+      file = { file: line.slice('+++ b/'.length).replace(/\n$/, ''), hunks: [] };
+      files.push(file);
+    } else if (line.startsWith('@@ ')) {
+      const match = /^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@/.exec(line);
+      if (!match || !file) {
+        throw new Error(`Unexpected hunk header: ${line.trim()}`);
+      }
+      hunk = {
+        old: { start: Number(match[1]), lines: [] },
+        new: { start: Number(match[3]), lines: [] },
+        oldLeft: match[2] === undefined ? 1 : Number(match[2]),
+        newLeft: match[4] === undefined ? 1 : Number(match[4])
+      };
+      file.hunks.push(hunk);
+    }
+  }
+  return files;
+}
+
+// Finds `wanted` in `lines`, starting at `expected` and moving outwards.
+function findLines(lines, wanted, expected) {
+  const matchesAt = index => index >= 0 && index + wanted.length <= lines.length &&
+    wanted.every((line, i) => lines[index + i] === line);
+  for (let distance = 0; distance <= lines.length; distance++) {
+    if (matchesAt(expected - distance)) {
+      return expected - distance;
+    }
+    if (matchesAt(expected + distance)) {
+      return expected + distance;
+    }
+  }
+  return -1;
+}
+
+/**
+ * Applies `hunks` to `text`, or undoes them when `reverse` is set. Returns
+ * the new text, or null when a hunk does not match.
+ */
+function applyHunks(text, hunks, reverse) {
+  const lines = splitLines(text);
+  let offset = 0;
+  for (const hunk of hunks) {
+    const [from, to] = reverse ? [hunk.new, hunk.old] : [hunk.old, hunk.new];
+    // A hunk that only adds lines starts after the line it names.
+    const expected = (from.lines.length ? from.start - 1 : from.start) + offset;
+    const index = findLines(lines, from.lines, expected);
+    if (index === -1) {
+      return null;
+    }
+    lines.splice(index, from.lines.length, ...to.lines);
+    offset += index - expected + to.lines.length - from.lines.length;
+  }
+  return lines.join('');
+}
+
+/**
+ * Applies every file of a patch, or none of them. Returns false when the
+ * patch is already applied.
+ */
+function applyPatch(patchFile) {
+  const files = parsePatch(fs.readFileSync(patchFile, 'utf8'));
+  const sources = files.map(({ file }) => fs.readFileSync(path.join(ROOT, file), 'utf8'));
+  if (files.every(({ hunks }, i) => applyHunks(sources[i], hunks, true) !== null)) {
+    return false;
+  }
+  const patched = files.map(({ file, hunks }, i) => {
+    const result = applyHunks(sources[i], hunks, false);
+    if (result === null) {
+      throw new Error(`${path.basename(patchFile)} does not apply to ${file}`);
+    }
+    return result;
+  });
+  files.forEach(({ file }, i) => fs.writeFileSync(path.join(ROOT, file), patched[i]));
+  return true;
+}
+
+function applyPatches() {
+  if (!fs.existsSync(PATCHES_DIR)) {
+    return;
+  }
+  const files = fs.readdirSync(PATCHES_DIR).filter(file => file.endsWith('.patch')).sort();
+  for (const file of files) {
+    const match = /^(.+)\+([^+]+)\.patch$/.exec(file);
+    if (!match) {
+      throw new Error(`Cannot tell which package ${file} is for`);
+    }
+    const name = match[1].replace(/\+/g, '/');
+    const packageJson = path.join(ROOT, 'node_modules', name, 'package.json');
+    if (!fs.existsSync(packageJson)) {
+      // e.g. `npm ci --omit=dev` leaves out the `vercel` CLI and its builders.
+      console.log(`apply-patches: ${name} is not installed, skipping ${file}`);
+      continue;
+    }
+    const { version } = JSON.parse(fs.readFileSync(packageJson, 'utf8'));
+    if (version !== match[2]) {
+      throw new Error(`${file} is for ${name}@${match[2]}, but ${version} is installed. Update the patch for the new version.`);
+    }
+    if (applyPatch(path.join(PATCHES_DIR, file))) {
+      console.log(`apply-patches: applied ${file}`);
+    } else {
+      console.log(`apply-patches: ${file} is already applied`);
+    }
+  }
+}
+
+if (require.main === module) {
+  try {
+    applyPatches();
+  } catch (error) {
+    console.error(`apply-patches: ${error.message}`);
+    process.exit(1);
+  }
+}
+
+module.exports = { parsePatch, applyHunks };
@@ -0,0 +1,323 @@
+const fs = require('fs');
+const http = require('http');
+const net = require('net');
+const os = require('os');
+const path = require('path');
+const { spawn, spawnSync } = require('child_process');
+
+/**
+ * Helpers for driving the patched Python runtimes in node_modules:
+ * `@vercel/python`'s vc_init.py and `@vercel/fun`'s python bootstrap.py.
+ */
+
+const ROOT = path.join(__dirname, '..', '..');
+const VC_INIT = path.join(ROOT, 'node_modules', '@vercel', 'python', 'vc_init.py');
+const BOOTSTRAP = path.join(ROOT, 'node_modules', '@vercel', 'fun', 'dist', 'src', 'runtimes', 'python', 'bootstrap.py');
+const PYTHON = process.env.PYTHON || 'python3';
+
+function hasPython() {
+  const result = spawnSync(PYTHON, ['-c', 'import sys; sys.exit(sys.version_info < (3, 8))']);
+  return result.status === 0;
+}
+
+/**
+ * Writes `files` (name -> source) to a temporary directory together with
+ * vc_init.py rendered for `app.py`, the way @vercel/python does at build time.
+ */
+function createAppDir(files) {
+  const dir = fs.mkdtempSync(path.join(os.tmpdir(), 'vc-python-'));
+  for (const [name, source] of Object.entries(files)) {
+    fs.mkdirSync(path.dirname(path.join(dir, name)), { recursive: true });
+    fs.writeFileSync(path.join(dir, name), source);
+  }
+  const template = fs.readFileSync(VC_INIT, 'utf8');
+  fs.writeFileSync(
+    path.join(dir, 'vc__handler__python.py'),
+    template
+      .replace(/__VC_HANDLER_MODULE_NAME/g, 'app')
+      .replace(/__VC_HANDLER_ENTRYPOINT/g, 'app.py')
+  );
+  return dir;
+}
+
+function waitForExit(proc, timeout = 10000) {
+  if (proc.exitCode !== null || proc.signalCode !== null) {
+    return Promise.resolve();
+  }
+  return new Promise(resolve => {
+    const timer = setTimeout(() => {
+      proc.kill('SIGKILL');
+    }, timeout);
+    proc.once('exit', () => {
+      clearTimeout(timer);
+      resolve();
+    });
+  });
+}
+
+/**
+ * vc_init.py running in IPC mode. Plays the Vercel side of
+ * `VERCEL_IPC_PATH` and keeps every message the runtime ships, with log
+ * messages decoded into `text`.
+ */
+class IPCRuntime {
+  static async start(files, env = {}) {
+    const runtime = new IPCRuntime(createAppDir(files));
+    await runtime.listen(env);
+    return runtime;
+  }
+
+  constructor(dir) {
+    this.dir = dir;
+    this.messages = [];
+    this.requestId = 0;
+    this.connection = null;
+  }
+
+  listen(env) {
+    const socketPath = path.join(this.dir, 'ipc.sock');
+    this.server = net.createServer(connection => {
+      this.connection = connection;
+      let buffer = Buffer.alloc(0);
+      connection.on('data', data => {
+        buffer = Buffer.concat([buffer, data]);
+        let end;
+        while ((end = buffer.indexOf(0)) !== -1) {
+          const message = JSON.parse(buffer.subarray(0, end).toString());
+          buffer = buffer.subarray(end + 1);
+          if (message.type === 'log') {
+            message.text = Buffer.from(message.payload.message, 'base64').toString();
+          }
+          this.messages.push(message);
+        }
+      });
+    });
+    return new Promise((resolve, reject) => {
+      this.server.listen(socketPath, () => {
+        this.proc = spawn(PYTHON, ['vc__handler__python.py'], {
+          cwd: this.dir,
+          env: { ...process.env, VERCEL_IPC_PATH: socketPath, ...env },
+          stdio: ['ignore', 'pipe', 'pipe']
+        });
+        this.output = '';
+        this.proc.stdout.on('data', data => { this.output += data; });
+        this.proc.stderr.on('data', data => { this.output += data; });
+        this.proc.once('exit', code => reject(new Error(`vc_init.py exited with ${code}: ${this.output}`)));
+        this.waitFor(message => message.type === 'server-started')
+          .then(message => {
+            this.port = message.payload.httpPort;
+            this.serverStarted = message.payload;
+            resolve();
+          }, reject);
+      });
+    });
+  }
+
+  /**
+   * Resolves with the first message matching `predicate`, waiting for it to
+   * arrive if needed.
+   */
+  async waitFor(predicate, timeout = 10000) {
+    const deadline = Date.now() + timeout;
+    while (Date.now() < deadline) {
+      const message = this.messages.find(predicate);
+      if (message) {
+        return message;
+      }
+      await new Promise(resolve => setTimeout(resolve, 10));
+    }
+    throw new Error('Timed out waiting for an IPC message');
+  }
+
+  /**
+   * Messages shipped for the request with the given `requestId`.
+   */
+  messagesFor(requestId) {
+    return this.messages.filter(message => message.payload && message.payload.context &&
+      message.payload.context.requestId === requestId);
+  }
+
+  /**
+   * Stops reading from the IPC socket, so the runtime's writes back up.
+   */
+  pauseIPC() {
+    this.connection.pause();
+  }
+
+  resumeIPC() {
+    this.connection.resume();
+  }
+
+  /**
+   * Sends one request with the internal headers Vercel adds. Resolves with
+   * `{ requestId, status, headers, body, reusedSocket }` and rejects if the
+   * response is cut off.
+   */
+  request({ method = 'GET', path: requestPath = '/', headers = {}, body, agent } = {}) {
+    const requestId = ++this.requestId;
+    return new Promise((resolve, reject) => {
+      const req = http.request({
+        host: '127.0.0.1',
+        port: this.port,
+        method,
+        path: requestPath,
+        agent,
+        headers: {
+          'x-vercel-internal-invocation-id': 'test-invocation',
+          'x-vercel-internal-request-id': String(requestId),
+          'x-vercel-internal-span-id': 'test-span',
+          'x-vercel-internal-trace-id': 'test-trace',
+          ...headers
+        }
+      }, res => {
+        const chunks = [];
+        res.on('data', chunk => chunks.push(chunk));
+        // Node reports a body cut off mid-stream as an `aborted` error.
+        res.on('error', err => reject(new Error(`Response was cut off: ${err.message}`)));
+        res.on('close', () => {
+          if (!res.complete) {
+            reject(new Error('Response was cut off'));
+          }
+        });
+        res.on('end', () => resolve({
+          requestId,
+          status: res.statusCode,
+          headers: res.headers,
+          body: Buffer.concat(chunks),
+          reusedSocket: req.reusedSocket
+        }));
+      });
+      req.on('error', reject);
+      req.end(body);
+    });
+  }
+
+  async stop() {
+    if (this.proc) {
+      this.proc.removeAllListeners('exit');
+      this.proc.kill('SIGTERM');
+      await waitForExit(this.proc);
+    }
+    await new Promise(resolve => this.server.close(resolve));
+    fs.rmSync(this.dir, { recursive: true, force: true });
+  }
+}
+
+/**
+ * Imports the rendered vc_init.py outside IPC mode and calls its
+ * `vc_handler` with each of `events`. Returns the handler's results.
+ */
+function invokeLambdaHandler(files, events, env = {}) {
+  const dir = createAppDir(files);
+  const script = [
+    'import json, sys',
+    'import vc__handler__python as runtime',
+    'events = json.loads(sys.argv[1])',
+    'results = [runtime.vc_handler({"body": json.dumps(event)}, {}) for event in events]',
+    'sys.stdout.write("\\nRESULTS " + json.dumps(results) + "\\n")'
+  ].join('\n');
+  try {
+    const result = spawnSync(PYTHON, ['-c', script, JSON.stringify(events)], {
+      cwd: dir,
+      env: { ...process.env, ...env },
+      encoding: 'utf8'
+    });
+    const line = result.stdout.split('\n').find(text => text.startsWith('RESULTS '));
+    if (!line) {
+      throw new Error(`vc_handler failed: ${result.stdout}${result.stderr}`);
+    }
+    return JSON.parse(line.slice('RESULTS '.length));
+  } finally {
+    fs.rmSync(dir, { recursive: true, force: true });
+  }
+}
+
+/**
+ * fun's Runtime API server with bootstrap.py attached to it, running the
+ * `handler` function of `files['lambda_function.py']`. `connections` counts
+ * the TCP connections bootstrap.py opened to the server.
+ */
+class FunRuntime {
+  static async start(files, { timeout = 10, env = {} } = {}) {
+    const { RuntimeServer } = require(path.join(ROOT, 'node_modules', '@vercel', 'fun', 'dist', 'src', 'runtime-server.js'));
+    const runtime = new FunRuntime();
+    runtime.dir = fs.mkdtempSync(path.join(os.tmpdir(), 'fun-python-'));
+    for (const [name, source] of Object.entries(files)) {
+      fs.writeFileSync(path.join(runtime.dir, name), source);
+    }
+    runtime.server = new RuntimeServer({ timeout });
+    runtime.connections = 0;
+    runtime.server.on('connection', () => { runtime.connections++; });
+    await new Promise(resolve => runtime.server.listen(0, '127.0.0.1', resolve));
+    runtime.proc = spawn(PYTHON, [BOOTSTRAP], {
+      env: {
+        ...process.env,
+        AWS_LAMBDA_RUNTIME_API: `127.0.0.1:${runtime.server.address().port}`,
+        LAMBDA_TASK_ROOT: runtime.dir,
+        _HANDLER: 'lambda_function.handler',
+        ...env
+      },
+      stdio: ['ignore', 'ignore', 'inherit']
+    });
+    runtime.proc.once('exit', () => runtime.server.close());
+    await runtime.server.initDeferred.promise;
+    return runtime;
+  }
+
+  async invoke(event) {
+    const result = await this.server.invoke({ Payload: JSON.stringify(event) });
+    return { ...result, Payload: JSON.parse(result.Payload) };
+  }
+
+  async stop() {
+    this.proc.kill('SIGTERM');
+    await waitForExit(this.proc);
+    fs.rmSync(this.dir, { recursive: true, force: true });
+  }
+}
+
+/**
+ * A `python3` function created with fun's `createFunction`, so invocations go
+ * through its native provider: a pool of bootstrap.py processes that are
+ * frozen between invocations.
+ */
+class FunFunction {
+  static async start(files, env = {}) {
+    const { createFunction } = require(path.join(ROOT, 'node_modules', '@vercel', 'fun'));
+    const dir = fs.mkdtempSync(path.join(os.tmpdir(), 'fun-python-'));
+    for (const [name, source] of Object.entries(files)) {
+      fs.writeFileSync(path.join(dir, name), source);
+    }
+    const fn = await createFunction({
+      Code: { Directory: dir },
+      Handler: 'lambda_function.handler',
+      Runtime: 'python3',
+      Timeout: 10,
+      Environment: { Variables: env }
+    });
+    return new FunFunction(fn, dir);
+  }
+
+  constructor(fn, dir) {
+    this.fn = fn;
+    this.dir = dir;
+  }
+
+  async invoke(event) {
+    const result = await this.fn.invoke({ Payload: JSON.stringify(event) });
+    return { ...result, Payload: JSON.parse(result.Payload) };
+  }
+
+  async stop() {
+    await this.fn.destroy();
+    fs.rmSync(this.dir, { recursive: true, force: true });
+  }
+}
+
+module.exports = {
+  hasPython,
+  IPCRuntime,
+  FunRuntime,
+  FunFunction,
+  invokeLambdaHandler
+};
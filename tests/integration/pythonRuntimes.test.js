@@ -0,0 +1,529 @@
+const crypto = require('crypto');
+const fs = require('fs');
+const http = require('http');
+const path = require('path');
+const {
+  hasPython,
+  IPCRuntime,
+  FunRuntime,
+  FunFunction,
+  invokeLambdaHandler
+} = require('../helpers/pythonRuntimes');
+
+// Behavior tests for the patched Python runtimes in node_modules (see
+// patches/). They run the real runtime files against local stand-ins.
+const describeIfPython = hasPython() ? describe : describe.skip;
+
+const md5 = data => crypto.createHash('md5').update(data).digest('hex');
+// The app's own output, without the access log line each request adds.
+const appLines = messages => messages
+  .filter(message => message.type === 'log' && message.text.startsWith('line '))
+  .map(message => message.text);
+
+const LIFESPAN_APP = `
+import os
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                scope['state']['greeting'] = 'hello from startup'
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                open('shutdown-complete', 'w').close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    await receive()
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [[b'content-type', b'text/plain']]})
+    await send({'type': 'http.response.body', 'body': scope['state']['greeting'].encode()})
+`;
+
+const STREAMING_APP = `
+import hashlib
+
+async def app(scope, receive, send):
+    if scope['type'] != 'http':
+        return
+    path = scope['path']
+    if path == '/stream':
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        for part in (b'first,', b'second,', b'third'):
+            await send({'type': 'http.response.body', 'body': part, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    elif path == '/fail-midway':
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'part1', 'more_body': True})
+        raise ValueError('failed after the first chunk')
+    elif path == '/no-response':
+        return
+    elif path == '/ignore-body':
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [[b'content-length', b'7']]})
+        await send({'type': 'http.response.body', 'body': b'ignored'})
+    else:
+        chunks = 0
+        digest = hashlib.md5()
+        more_body = True
+        while more_body:
+            message = await receive()
+            chunks += 1
+            digest.update(message.get('body', b''))
+            more_body = message.get('more_body', False)
+        body = ('%d %s' % (chunks, digest.hexdigest())).encode()
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [[b'content-length', str(len(body)).encode()]]})
+        await send({'type': 'http.response.body', 'body': body})
+`;
+
+const CHATTY_APP = `
+import sys
+
+async def app(scope, receive, send):
+    if scope['type'] != 'http':
+        return
+    count = int(scope['query_string'] or 50)
+    for i in range(count):
+        print('line %d %s' % (i, 'x' * 1000 if count > 100 else ''))
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'done'})
+`;
+
+const WSGI_APP = `
+def app(environ, start_response):
+    if environ['PATH_INFO'] == '/partial-read':
+        data = environ['wsgi.input'].read(10)
+    else:
+        data = environ['wsgi.input'].read()
+    start_response('200 OK', [('Content-Length', str(len(data)))])
+    return [data]
+`;
+
+const HANDLER_APP = `
+import json
+from http.server import BaseHTTPRequestHandler
+
+class handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['content-length']))
+        result = json.dumps({
+            'path': self.path,
+            'body': body.decode(),
+            'host': self.headers.get('host'),
+            'acceptEncoding': self.headers.get('accept-encoding'),
+            'serverHost': self.server.server_address[0],
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
+`;
+
+const BUSY_APP = `
+import asyncio
+
+active = 0
+peak = 0
+
+async def app(scope, receive, send):
+    global active, peak
+    if scope['type'] != 'http':
+        return
+    active += 1
+    peak = max(peak, active)
+    await asyncio.sleep(0.2)
+    active -= 1
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': str(peak).encode()})
+`;
+
+describeIfPython('@vercel/python vc_init.py', () => {
+  describe('ASGI lifespan', () => {
+    test('shares startup state with requests and runs shutdown on SIGTERM', async () => {
+      const runtime = await IPCRuntime.start({ 'app.py': LIFESPAN_APP });
+      const dir = runtime.dir;
+      try {
+        const first = await runtime.request();
+        const second = await runtime.request();
+        expect(first.body.toString()).toBe('hello from startup');
+        expect(second.body.toString()).toBe('hello from startup');
+
+        runtime.proc.removeAllListeners('exit');
+        const exited = new Promise(resolve => runtime.proc.once('exit', resolve));
+        runtime.proc.kill('SIGTERM');
+        await exited;
+        expect(fs.existsSync(path.join(dir, 'shutdown-complete'))).toBe(true);
+      } finally {
+        await runtime.stop();
+      }
+    });
+  });
+
+  describe('ASGI responses over IPC', () => {
+    let runtime;
+
+    beforeAll(async () => {
+      runtime = await IPCRuntime.start({ 'app.py': STREAMING_APP });
+    });
+
+    afterAll(async () => {
+      await runtime.stop();
+    });
+
+    test('streams a body without content-length as chunks', async () => {
+      const agent = new http.Agent({ keepAlive: true, maxSockets: 1 });
+      try {
+        const first = await runtime.request({ path: '/stream', agent });
+        const second = await runtime.request({ path: '/stream', agent });
+        expect(first.status).toBe(200);
+        expect(first.headers['transfer-encoding']).toBe('chunked');
+        expect(first.body.toString()).toBe('first,second,third');
+        expect(second.body.toString()).toBe('first,second,third');
+        expect(second.reusedSocket).toBe(true);
+      } finally {
+        agent.destroy();
+      }
+    });
+
+    test('cuts the response off when the app fails mid-body', async () => {
+      await expect(runtime.request({ path: '/fail-midway' })).rejects.toThrow('Response was cut off');
+    });
+
+    test('answers 500 when the app returns without responding', async () => {
+      const response = await runtime.request({ path: '/no-response' });
+      expect(response.status).toBe(500);
+      expect(response.headers.connection).toBe('close');
+    });
+
+    test('delivers large request bodies in 64 KiB chunks', async () => {
+      const body = crypto.randomBytes(200000);
+      const response = await runtime.request({ method: 'POST', path: '/echo', body });
+      expect(response.body.toString()).toBe(`4 ${md5(body)}`);
+    });
+
+    test('discards an unread body and keeps the connection usable', async () => {
+      const agent = new http.Agent({ keepAlive: true, maxSockets: 1 });
+      try {
+        const ignored = await runtime.request({ method: 'POST', path: '/ignore-body', body: crypto.randomBytes(150000), agent });
+        const body = Buffer.from('after the ignored body');
+        const next = await runtime.request({ method: 'POST', path: '/echo', body, agent });
+        expect(ignored.body.toString()).toBe('ignored');
+        expect(next.reusedSocket).toBe(true);
+        expect(next.body.toString()).toBe(`1 ${md5(body)}`);
+      } finally {
+        agent.destroy();
+      }
+    });
+  });
+
+  describe('ASGI concurrency', () => {
+    test('runs at most VERCEL_PYTHON_MAX_CONCURRENCY requests at once', async () => {
+      const runtime = await IPCRuntime.start({ 'app.py': BUSY_APP }, {
+        VERCEL_PYTHON_MAX_CONCURRENCY: '2'
+      });
+      try {
+        const responses = await Promise.all([1, 2, 3, 4, 5, 6].map(() => runtime.request()));
+        expect(responses.map(response => response.status)).toEqual(Array(6).fill(200));
+        expect(Math.max(...responses.map(response => Number(response.body.toString())))).toBe(2);
+      } finally {
+        await runtime.stop();
+      }
+    });
+  });
+
+  describe('WSGI request bodies', () => {
+    test('reads the body lazily and drains what the app leaves unread', async () => {
+      const runtime = await IPCRuntime.start({ 'app.py': WSGI_APP });
+      const agent = new http.Agent({ keepAlive: true, maxSockets: 1 });
+      try {
+        const body = crypto.randomBytes(100000);
+        const partial = await runtime.request({ method: 'POST', path: '/partial-read', body, agent });
+        const full = await runtime.request({ method: 'POST', path: '/full-read', body, agent });
+        expect(partial.body.equals(body.subarray(0, 10))).toBe(true);
+        expect(full.reusedSocket).toBe(true);
+        expect(md5(full.body)).toBe(md5(body));
+      } finally {
+        agent.destroy();
+        await runtime.stop();
+      }
+    });
+  });
+
+  describe('IPC message shipping', () => {
+    test('ships a request\'s messages in order, ending with `end`', async () => {
+      const runtime = await IPCRuntime.start({ 'app.py': CHATTY_APP });
+      try {
+        const responses = await Promise.all([1, 2, 3].map(() => runtime.request({ path: '/?50' })));
+        for (const { requestId } of responses) {
+          await runtime.waitFor(message => message.type === 'end' && message.payload.context.requestId === requestId);
+          const messages = runtime.messagesFor(requestId);
+          expect(messages[0].type).toBe('handler-started');
+          expect(messages[messages.length - 1].type).toBe('end');
+          expect(appLines(messages)).toEqual(Array.from({ length: 50 }, (_, i) => `line ${i} \n`));
+        }
+      } finally {
+        await runtime.stop();
+      }
+    });
+
+    test('escapes log text that is not valid UTF-8', async () => {
+      const runtime = await IPCRuntime.start({
+        'app.py': `
+async def app(scope, receive, send):
+    if scope['type'] != 'http':
+        return
+    print('line \\udcff')
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'done'})
+`
+      });
+      try {
+        const response = await runtime.request();
+        await runtime.waitFor(message => message.type === 'end' && message.payload.context.requestId === response.requestId);
+        expect(appLines(runtime.messagesFor(response.requestId))).toEqual(['line \\udcff\n']);
+      } finally {
+        await runtime.stop();
+      }
+    });
+
+    test('drops logs past a full queue and reports how many', async () => {
+      const runtime = await IPCRuntime.start({ 'app.py': CHATTY_APP }, {
+        VERCEL_IPC_QUEUE_SIZE: '10',
+        VERCEL_IPC_QUEUE_POLICY: 'drop'
+      });
+      try {
+        runtime.pauseIPC();
+        const response = await runtime.request({ path: '/?2000' });
+        runtime.resumeIPC();
+        await runtime.waitFor(message => message.type === 'end' && message.payload.context.requestId === response.requestId);
+
+        const messages = runtime.messagesFor(response.requestId);
+        const report = messages.find(message => message.type === 'log' &&
+          /^Dropped \d+ log and metric messages/.test(message.text));
+        expect(response.body.toString()).toBe('done');
+        expect(report).toBeDefined();
+        const dropped = Number(/^Dropped (\d+)/.exec(report.text)[1]);
+        expect(dropped).toBeGreaterThan(0);
+        // The access log line may be among the dropped messages.
+        const accounted = appLines(messages).length + dropped;
+        expect(accounted).toBeGreaterThanOrEqual(2000);
+        expect(accounted).toBeLessThanOrEqual(2001);
+      } finally {
+        await runtime.stop();
+      }
+    });
+
+    test('samples logs past a full queue without blocking the request', async () => {
+      const runtime = await IPCRuntime.start({ 'app.py': CHATTY_APP }, {
+        VERCEL_IPC_QUEUE_SIZE: '10',
+        VERCEL_IPC_QUEUE_POLICY: 'sample'
+      });
+      try {
+        runtime.pauseIPC();
+        const response = await runtime.request({ path: '/?2000' });
+        runtime.resumeIPC();
+        await runtime.waitFor(message => message.type === 'end' && message.payload.context.requestId === response.requestId);
+
+        const messages = runtime.messagesFor(response.requestId);
+        const report = messages.find(message => message.type === 'log' &&
+          /^Dropped \d+ log and metric messages/.test(message.text));
+        expect(response.body.toString()).toBe('done');
+        expect(report).toBeDefined();
+        expect(appLines(messages).length).toBeLessThan(2000);
+      } finally {
+        await runtime.stop();
+      }
+    });
+
+    test('keeps every log past a full queue with the block policy', async () => {
+      const runtime = await IPCRuntime.start({ 'app.py': CHATTY_APP }, {
+        VERCEL_IPC_QUEUE_SIZE: '10',
+        VERCEL_IPC_QUEUE_POLICY: 'block'
+      });
+      try {
+        runtime.pauseIPC();
+        const pending = runtime.request({ path: '/?2000' });
+        await new Promise(resolve => setTimeout(resolve, 300));
+        runtime.resumeIPC();
+        const response = await pending;
+        await runtime.waitFor(message => message.type === 'end' && message.payload.context.requestId === response.requestId);
+
+        const lines = appLines(runtime.messagesFor(response.requestId))
+          .map(text => Number(text.split(' ')[1]));
+        expect(lines).toEqual(Array.from({ length: 2000 }, (_, i) => i));
+      } finally {
+        await runtime.stop();
+      }
+    });
+  });
+
+  describe('cold start profiler', () => {
+    test('reports imports without replacing module loaders', async () => {
+      const runtime = await IPCRuntime.start({
+        'mypkg/__init__.py': '',
+        'app.py': `
+import mypkg
+
+async def app(scope, receive, send):
+    if scope['type'] != 'http':
+        return
+    body = type(mypkg.__loader__).__name__ + ' ' + type(mypkg.__spec__.loader).__name__
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': body.encode()})
+`
+      }, { VERCEL_PYTHON_PROFILE_STARTUP: '1' });
+      try {
+        const response = await runtime.request();
+        expect(response.body.toString()).toBe('SourceFileLoader SourceFileLoader');
+        const modules = runtime.serverStarted.coldStart.imports.map(entry => entry.module);
+        expect(modules).toContain('mypkg');
+      } finally {
+        await runtime.stop();
+      }
+    });
+  });
+
+  describe('BaseHTTPRequestHandler apps', () => {
+    test('in-process dispatch matches the loopback server', () => {
+      const events = [
+        { method: 'POST', path: '/echo?x=1', headers: { 'content-type': 'text/plain' }, body: 'hello' },
+        { method: 'POST', path: '/echo', headers: { Host: 'example.com', 'Accept-Encoding': 'gzip' }, body: 'hi' }
+      ];
+      const files = { 'app.py': HANDLER_APP };
+      const loopback = invokeLambdaHandler(files, events, { VERCEL_HANDLER_IN_PROCESS: '0' });
+      const inProcess = invokeLambdaHandler(files, events, { VERCEL_HANDLER_IN_PROCESS: '1' });
+
+      for (let i = 0; i < events.length; i++) {
+        const expected = JSON.parse(loopback[i].body);
+        const actual = JSON.parse(inProcess[i].body);
+        expect(inProcess[i].statusCode).toBe(loopback[i].statusCode);
+        expect(actual.host).toBeTruthy();
+        // The loopback Host carries the ephemeral port of its server.
+        delete expected.host;
+        delete actual.host;
+        expect(actual).toEqual(expected);
+      }
+      expect(JSON.parse(inProcess[1].body).host).toBe('example.com');
+    });
+  });
+});
+
+describeIfPython('@vercel/fun python bootstrap.py', () => {
+  const LAMBDA_FUNCTION = `
+import os
+import time
+
+def handler(event, context):
+    if event.get('crash') == 'unserializable':
+        return {'bad': object()}
+    if event.get('crash') == 'exit':
+        os._exit(1)
+    time.sleep(event.get('sleep', 0))
+    return {
+        'id': event['id'],
+        'remainingMs': context.get_remaining_time_in_millis(),
+        'requestId': context.aws_request_id,
+        'sameRequestId': context['aws_request_id'] == context.aws_request_id,
+        'runtimeApi': os.environ['AWS_LAMBDA_RUNTIME_API'],
+        'pid': os.getpid(),
+    }
+`;
+
+  test('reuses one Runtime API connection and passes a context object', async () => {
+    const runtime = await FunRuntime.start({ 'lambda_function.py': LAMBDA_FUNCTION });
+    try {
+      const results = [];
+      for (const id of [1, 2, 3]) {
+        results.push(await runtime.invoke({ id }));
+      }
+      expect(results.map(result => result.FunctionError)).toEqual(Array(3).fill(undefined));
+      expect(results.map(result => result.Payload.id)).toEqual([1, 2, 3]);
+      expect(results.map(result => result.Payload.sameRequestId)).toEqual(Array(3).fill(true));
+      expect(runtime.connections).toBe(1);
+    } finally {
+      await runtime.stop();
+    }
+  });
+
+  test('passes a real deadline to handlers', async () => {
+    const runtime = await FunRuntime.start({ 'lambda_function.py': LAMBDA_FUNCTION }, { timeout: 10 });
+    try {
+      const result = await runtime.invoke({ id: 1 });
+      expect(result.FunctionError).toBeUndefined();
+      expect(result.Payload.remainingMs).toBeGreaterThan(5000);
+      expect(result.Payload.remainingMs).toBeLessThanOrEqual(10000);
+    } finally {
+      await runtime.stop();
+    }
+  });
+
+  test.each(['thread', 'fork'])('serves concurrent invocations with %s workers', async mode => {
+    const runtime = await FunRuntime.start({ 'lambda_function.py': LAMBDA_FUNCTION }, {
+      env: { FUN_PYTHON_WORKERS: '3', FUN_PYTHON_WORKER_MODE: mode }
+    });
+    try {
+      const results = await Promise.all([1, 2, 3, 4, 5, 6].map(id => runtime.invoke({ id })));
+      expect(results.map(result => result.FunctionError)).toEqual(Array(6).fill(undefined));
+      expect(results.map(result => result.Payload.id)).toEqual([1, 2, 3, 4, 5, 6]);
+      expect(new Set(results.map(result => result.Payload.requestId)).size).toBe(6);
+    } finally {
+      await runtime.stop();
+    }
+  });
+
+  test.each(['thread', 'fork'])('reports invocations whose worker failed with %s workers', async mode => {
+    const runtime = await FunRuntime.start({ 'lambda_function.py': LAMBDA_FUNCTION }, {
+      env: { FUN_PYTHON_WORKERS: '2', FUN_PYTHON_WORKER_MODE: mode }
+    });
+    // `os._exit` in a worker thread would end the whole runtime.
+    const crashes = mode === 'fork' ? ['unserializable', 'exit'] : ['unserializable'];
+    try {
+      const failed = await Promise.all(crashes.map(crash => runtime.invoke({ id: 0, crash })));
+      expect(failed.map(result => result.FunctionError)).toEqual(crashes.map(() => 'Handled'));
+      expect(failed[0].Payload.error).toContain('TypeError');
+      if (mode === 'fork') {
+        expect(failed[1].Payload.error).toContain('exited with code 1');
+      }
+      const results = await Promise.all([1, 2, 3].map(id => runtime.invoke({ id })));
+      expect(results.map(result => result.Payload.id)).toEqual([1, 2, 3]);
+    } finally {
+      await runtime.stop();
+    }
+  });
+
+  test.each(['thread', 'fork'])('shares one fun process between invocations with %s workers', async mode => {
+    const fn = await FunFunction.start({ 'lambda_function.py': LAMBDA_FUNCTION }, {
+      FUN_PYTHON_WORKERS: '3',
+      FUN_PYTHON_WORKER_MODE: mode
+    });
+    try {
+      // Boots the process, so the timed invocations below find it running.
+      await fn.invoke({ id: 0 });
+      const start = Date.now();
+      const results = await Promise.all([1, 2, 3].map(id => fn.invoke({ id, sleep: 0.5 })));
+      const elapsed = Date.now() - start;
+      expect(results.map(result => result.FunctionError)).toEqual(Array(3).fill(undefined));
+      expect(new Set(results.map(result => result.Payload.runtimeApi)).size).toBe(1);
+      expect(elapsed).toBeLessThan(1500);
+      const pids = new Set(results.map(result => result.Payload.pid));
+      expect(pids.size).toBe(mode === 'fork' ? 3 : 1);
+      if (process.platform === 'linux') {
+        // Frozen between invocations, forked workers included. A process
+        // stops shortly after `SIGSTOP` is sent, so give it a moment.
+        const isStopped = async pid => {
+          for (let attempt = 0; attempt < 50; attempt++) {
+            if (/^State:\s+T/m.test(fs.readFileSync(`/proc/${pid}/status`, 'utf8'))) {
+              return true;
+            }
+            await new Promise(resolve => setTimeout(resolve, 10));
+          }
+          return false;
+        };
+        for (const pid of pids) {
+          expect(await isStopped(pid)).toBe(true);
+        }
+      }
+    } finally {
+      await fn.stop();
+    }
+  });
+});
@@ -0,0 +1,41 @@
+const fs = require('fs');
+const path = require('path');
+const { parsePatch, applyHunks } = require('../../scripts/apply-patches');
+
+const ROOT = path.join(__dirname, '..', '..');
+const PATCHES_DIR = path.join(ROOT, 'patches');
+
+const PATCH = `diff --git a/node_modules/example/index.js b/node_modules/example/index.js
+index 1111111..2222222 100644
+--- a/node_modules/example/index.js
++++ b/node_modules/example/index.js
+@@ -2,3 +2,4 @@ const a = 1;
+ const b = 2;
+--- c
++const c = 3;
++const d = 4;
+ module.exports = { a, b };
+`;
+
+describe('apply-patches', () => {
+  test('applies a hunk that moved and undoes it again', () => {
+    const [{ file, hunks }] = parsePatch(PATCH);
+    const original = '// header\nconst a = 1;\nconst b = 2;\n-- c\nmodule.exports = { a, b };\n';
+    const patched = applyHunks(original, hunks, false);
+    expect(file).toBe('node_modules/example/index.js');
+    expect(patched).toBe('// header\nconst a = 1;\nconst b = 2;\nconst c = 3;\nconst d = 4;\nmodule.exports = { a, b };\n');
+    expect(applyHunks(patched, hunks, true)).toBe(original);
+    expect(applyHunks(patched, hunks, false)).toBeNull();
+  });
+
+  test('every patch in patches/ matches the committed node_modules', () => {
+    const patches = fs.readdirSync(PATCHES_DIR).filter(file => file.endsWith('.patch'));
+    expect(patches.length).toBeGreaterThan(0);
+    for (const patch of patches) {
+      for (const { file, hunks } of parsePatch(fs.readFileSync(path.join(PATCHES_DIR, patch), 'utf8'))) {
+        const source = fs.readFileSync(path.join(ROOT, file), 'utf8');
+        expect(applyHunks(source, hunks, true)).not.toBeNull();
+      }
+    }
+  });
+});